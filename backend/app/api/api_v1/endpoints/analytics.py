@@ -1,121 +1,140 @@
 from typing import List, Optional
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from app.db.database import get_db
-from app.db.models import User, Expense, Merchant, Category
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, case, true, and_, tuple_
+from app.db.database import get_async_db
+from app.db.models import User, Expense, Merchant, Category, MonthlyRollup
 from app.schemas import SpendingAnalytics, MonthlySpending, SpendingByCategory
 from app.core.security import get_current_active_user
+from app.core.cache import cache_per_user
 
 router = APIRouter()
 
+def _shift_months(month_start: datetime, months: int) -> datetime:
+    """Move the first day of a month forward/backward by whole months"""
+    year, month = divmod(month_start.year * 12 + month_start.month - 1 + months, 12)
+    return month_start.replace(year=year, month=month + 1)
+
 @router.get("/spending-trends")
-def get_spending_trends(
-    months: int = Query(6, description="Number of months to analyze"),
+async def get_spending_trends(
+    months: int = Query(6, ge=1, description="Number of months to analyze"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get spending trends over time"""
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=months * 30)
+    # Whole calendar months, ending with the current one
+    current_month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    start_date = _shift_months(current_month_start, -(months - 1))
     
-    monthly_trends = db.query(
-        extract('year', Expense.expense_date).label('year'),
-        extract('month', Expense.expense_date).label('month'),
-        func.sum(Expense.amount).label('total_amount'),
-        func.count(Expense.id).label('transaction_count')
-    ).filter(
-        Expense.user_id == current_user.id,
-        Expense.expense_date >= start_date,
-        Expense.expense_date <= end_date
+    # Read pre-aggregated rows from the rollup instead of scanning expenses
+    rollup_month = tuple_(MonthlyRollup.year, MonthlyRollup.month)
+    monthly_total = func.sum(MonthlyRollup.total)
+    monthly_count = func.sum(MonthlyRollup.transaction_count)
+    monthly_trends = (await db.execute(select(
+        MonthlyRollup.year,
+        MonthlyRollup.month,
+        monthly_total.label('total_amount'),
+        monthly_count.label('transaction_count'),
+        func.sum(monthly_total).over().label('total_spending'),
+        func.avg(monthly_total).over().label('average_monthly')
+    ).where(
+        MonthlyRollup.user_id == current_user.id,
+        rollup_month >= (start_date.year, start_date.month),
+        rollup_month <= (current_month_start.year, current_month_start.month)
     ).group_by(
-        extract('year', Expense.expense_date),
-        extract('month', Expense.expense_date)
-    ).order_by(
-        extract('year', Expense.expense_date),
-        extract('month', Expense.expense_date)
-    ).all()
-    
-    trends = []
-    for trend in monthly_trends:
-        month_str = f"{int(trend.year)}-{int(trend.month):02d}"
-        trends.append({
-            "month": month_str,
+        MonthlyRollup.year, MonthlyRollup.month
+    ).having(monthly_count > 0).order_by(MonthlyRollup.year, MonthlyRollup.month))).all()
+    
+    trends = [
+        {
+            "month": f"{trend.year}-{trend.month:02d}",
             "total_amount": float(trend.total_amount),
             "transaction_count": trend.transaction_count,
             "average_transaction": float(trend.total_amount) / trend.transaction_count if trend.transaction_count > 0 else 0
-        })
+        }
+        for trend in monthly_trends
+    ]
+    
+    # Window totals are repeated on every row; read them off the first one
+    first = monthly_trends[0] if monthly_trends else None
     
     return {
         "period_months": months,
         "trends": trends,
-        "total_spending": sum(t["total_amount"] for t in trends),
-        "average_monthly": sum(t["total_amount"] for t in trends) / len(trends) if trends else 0
+        "total_spending": float(first.total_spending) if first else 0,
+        "average_monthly": float(first.average_monthly) if first else 0
     }
 
 @router.get("/category-breakdown")
-def get_category_breakdown(
+@cache_per_user
+async def get_category_breakdown(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get spending breakdown by category"""
+    now = datetime.now()
     if not start_date:
-        start_date = datetime.now() - timedelta(days=30)
+        start_date = now - timedelta(days=30)
     if not end_date:
-        end_date = datetime.now()
+        end_date = now
     
-    category_spending = db.query(
+    subtotal = func.sum(Expense.amount)
+    total = func.sum(subtotal).over()
+    category_spending = (await db.execute(select(
         Category.name.label('category'),
         Category.icon.label('icon'),
-        func.sum(Expense.amount).label('total_amount'),
+        subtotal.label('total_amount'),
         func.count(Expense.id).label('transaction_count'),
-        func.avg(Expense.amount).label('average_amount')
+        func.avg(Expense.amount).label('average_amount'),
+        total.label('total_spending'),
+        func.coalesce(subtotal * 100.0 / func.nullif(total, 0), 0).label('percentage')
     ).join(
         Merchant, Category.id == Merchant.category_id
     ).join(
         Expense, Merchant.id == Expense.merchant_id
-    ).filter(
+    ).where(
         Expense.user_id == current_user.id,
         Expense.expense_date >= start_date,
         Expense.expense_date <= end_date
-    ).group_by(Category.id, Category.name, Category.icon).all()
-    
-    total_spending = sum(float(cat.total_amount) for cat in category_spending)
+    ).group_by(
+        Category.id, Category.name, Category.icon
+    ).order_by(subtotal.desc()))).all()
     
-    breakdown = []
-    for cat in category_spending:
-        breakdown.append({
+    breakdown = [
+        {
             "category": cat.category,
             "icon": cat.icon,
             "total_amount": float(cat.total_amount),
             "transaction_count": cat.transaction_count,
             "average_amount": float(cat.average_amount),
-            "percentage": (float(cat.total_amount) / total_spending * 100) if total_spending > 0 else 0
-        })
-    
-    # Sort by total amount
-    breakdown.sort(key=lambda x: x["total_amount"], reverse=True)
+            "percentage": float(cat.percentage)
+        }
+        for cat in category_spending
+    ]
+    total_spending = float(category_spending[0].total_spending) if category_spending else 0.0
     
     return {
         "period": {
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat()
+            "start_date": start_date,
+            "end_date": end_date
         },
         "total_spending": total_spending,
         "categories": breakdown
     }
 
 @router.get("/merchant-analysis")
-def get_merchant_analysis(
+@cache_per_user
+async def get_merchant_analysis(
     limit: int = Query(10, description="Number of top merchants to return"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get top merchants by spending"""
-    top_merchants = db.query(
+    top_merchants = (await db.execute(select(
         Merchant.name.label('merchant'),
         Category.name.label('category'),
         func.sum(Expense.amount).label('total_amount'),
@@ -125,13 +144,13 @@ def get_merchant_analysis(
         Category, Merchant.category_id == Category.id
     ).join(
         Expense, Merchant.id == Expense.merchant_id
-    ).filter(
+    ).where(
         Expense.user_id == current_user.id
     ).group_by(
         Merchant.id, Merchant.name, Category.name
     ).order_by(
         func.sum(Expense.amount).desc()
-    ).limit(limit).all()
+    ).limit(limit))).all()
     
     merchants = []
     for merchant in top_merchants:
@@ -149,15 +168,15 @@ def get_merchant_analysis(
     }
 
 @router.get("/savings-potential")
-def get_savings_potential(
+async def get_savings_potential(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Calculate potential savings with optimal credit card usage"""
     from app.services.recommendation_engine import RecommendationEngine
     
     engine = RecommendationEngine(db)
-    spending_pattern = engine.get_user_spending_pattern(current_user.id)
+    spending_pattern = await engine.get_user_spending_pattern(current_user.id)
     
     if not spending_pattern:
         return {
@@ -166,10 +185,11 @@ def get_savings_potential(
         }
     
     # Get current rewards (assuming no optimized card usage)
-    current_rewards = sum(amount * 0.005 for amount in spending_pattern.values()) * 12  # Assume 0.5% base rate
+    monthly_amounts = np.fromiter(spending_pattern.values(), dtype=np.float64, count=len(spending_pattern))
+    current_rewards = float(monthly_amounts.sum()) * 0.005 * 12  # Assume 0.5% base rate
     
     # Get optimized recommendations
-    recommendations = engine.optimize_card_combination(current_user.id)
+    recommendations = await engine.optimize_card_combination(current_user.id)
     
     if not recommendations:
         return {
@@ -196,45 +216,51 @@ def get_savings_potential(
     }
 
 @router.get("/dashboard-summary")
-def get_dashboard_summary(
+@cache_per_user
+async def get_dashboard_summary(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get summary data for the dashboard"""
-    # Current month spending
-    current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    current_month_spending = db.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == current_user.id,
-        Expense.expense_date >= current_month_start
-    ).scalar() or 0.0
-    
-    # Last month spending
+    current_month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
-    last_month_end = current_month_start - timedelta(seconds=1)
-    last_month_spending = db.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == current_user.id,
-        Expense.expense_date >= last_month_start,
-        Expense.expense_date <= last_month_end
-    ).scalar() or 0.0
+    in_current_month = and_(
+        MonthlyRollup.year == current_month_start.year,
+        MonthlyRollup.month == current_month_start.month
+    )
     
-    # Total transactions this month
-    current_month_transactions = db.query(func.count(Expense.id)).filter(
-        Expense.user_id == current_user.id,
-        Expense.expense_date >= current_month_start
-    ).scalar() or 0
+    # Current/last month totals from at most two months of rollup rows
+    month_totals = select(
+        func.coalesce(func.sum(case((in_current_month, MonthlyRollup.total), else_=0.0)), 0.0).label('current_month_spending'),
+        func.coalesce(func.sum(case((in_current_month, 0.0), else_=MonthlyRollup.total)), 0.0).label('last_month_spending'),
+        func.coalesce(func.sum(case((in_current_month, MonthlyRollup.transaction_count), else_=0)), 0).label('current_month_transactions')
+    ).where(
+        MonthlyRollup.user_id == current_user.id,
+        tuple_(MonthlyRollup.year, MonthlyRollup.month).in_([
+            (last_month_start.year, last_month_start.month),
+            (current_month_start.year, current_month_start.month)
+        ])
+    ).subquery()
     
-    # Top category this month
-    top_category = db.query(
-        Category.name,
-        func.sum(Expense.amount).label('total')
+    # Top category this month; the rollup already holds one row per category
+    top_category = select(
+        Category.name.label('top_category'),
+        MonthlyRollup.total.label('top_category_amount')
     ).join(
-        Merchant, Category.id == Merchant.category_id
-    ).join(
-        Expense, Merchant.id == Expense.merchant_id
-    ).filter(
-        Expense.user_id == current_user.id,
-        Expense.expense_date >= current_month_start
-    ).group_by(Category.name).order_by(func.sum(Expense.amount).desc()).first()
+        MonthlyRollup, Category.id == MonthlyRollup.category_id
+    ).where(
+        MonthlyRollup.user_id == current_user.id,
+        in_current_month,
+        MonthlyRollup.transaction_count > 0
+    ).order_by(MonthlyRollup.total.desc()).limit(1).subquery()
+    
+    summary = (await db.execute(
+        select(month_totals, top_category).select_from(month_totals).outerjoin(top_category, true())
+    )).one()
+    
+    current_month_spending = float(summary.current_month_spending)
+    last_month_spending = float(summary.last_month_spending)
+    current_month_transactions = summary.current_month_transactions
     
     # Calculate month-over-month change
     spending_change = 0.0
@@ -242,11 +268,11 @@ def get_dashboard_summary(
         spending_change = ((current_month_spending - last_month_spending) / last_month_spending) * 100
     
     return {
-        "current_month_spending": float(current_month_spending),
-        "last_month_spending": float(last_month_spending),
+        "current_month_spending": current_month_spending,
+        "last_month_spending": last_month_spending,
         "spending_change_percentage": spending_change,
         "current_month_transactions": current_month_transactions,
-        "top_category": top_category.name if top_category else "No data",
-        "top_category_amount": float(top_category.total) if top_category else 0.0,
-        "average_transaction": float(current_month_spending) / current_month_transactions if current_month_transactions > 0 else 0.0
+        "top_category": summary.top_category or "No data",
+        "top_category_amount": float(summary.top_category_amount or 0.0),
+        "average_transaction": current_month_spending / current_month_transactions if current_month_transactions > 0 else 0.0
     }
\ No newline at end of file
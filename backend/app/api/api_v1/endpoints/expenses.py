@@ -1,135 +1,246 @@
-from typing import List, Optional
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+import numpy as np
 from datetime import datetime, date
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from app.db.database import get_db
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import func, extract, insert, select, exists
+from sqlalchemy.exc import IntegrityError
+from app.db.database import get_async_db
 from app.db.models import Expense, Merchant, Category, User
 from app.schemas import (
     Expense as ExpenseSchema, 
     ExpenseCreate, 
     ExpenseUpdate,
+    ExpensePage,
     Merchant as MerchantSchema,
     Category as CategorySchema
 )
 from app.core.security import get_current_active_user
+from app.core.cache import invalidate_user_cache
+from app.services.spending_rollup import rollup_delta
+
+# Categories and their merchants (read-only seed data)
+MALAYSIAN_MERCHANTS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "Dining": (
+        "McDonald's", "KFC", "Pizza Hut", "Burger King", "Subway",
+        "Starbucks", "Old Town White Coffee", "Secret Recipe",
+        "Sushi King", "Sakae Sushi", "Local Restaurant"
+    ),
+    "Groceries": (
+        "AEON", "Tesco", "Giant", "Jaya Grocer", "Cold Storage",
+        "Village Grocer", "Mercato", "Ben's Independent Grocer",
+        "NSK Trade City", "Econsave"
+    ),
+    "Petrol": (
+        "Shell", "Petronas", "BHP", "Caltex", "Esso"
+    ),
+    "E-commerce": (
+        "Shopee", "Lazada", "Zalora", "PG Mall", "11street",
+        "Hermo", "FashionValet", "Mudah.my"
+    ),
+    "Transportation": (
+        "Grab", "Touch 'n Go", "MyRapid", "KTM", "MRT",
+        "LRT", "Taxi", "Bus"
+    ),
+    "Entertainment": (
+        "GSC", "TGV", "MBO", "Netflix", "Spotify",
+        "Disney+", "Astro", "Gaming"
+    ),
+    "Bills & Utilities": (
+        "TNB", "Syabas", "Indah Water", "Astro", "Maxis",
+        "Celcom", "Digi", "U Mobile", "TIME", "Unifi"
+    ),
+    "Healthcare": (
+        "Guardian", "Watsons", "Caring", "Hospital",
+        "Clinic", "Pharmacy"
+    ),
+    "Shopping": (
+        "Pavilion KL", "KLCC", "Mid Valley", "1 Utama",
+        "Sunway Pyramid", "IOI City Mall", "The Gardens"
+    ),
+    "Travel": (
+        "AirAsia", "Malaysia Airlines", "Agoda", "Booking.com",
+        "Hotels.com", "Airbnb", "Hotel"
+    )
+})
 
 router = APIRouter()
 
+# ExpenseSchema nests merchant -> category; lazy loads are unavailable under asyncio
+_WITH_MERCHANT = (joinedload(Expense.merchant).joinedload(Merchant.category),)
+
 @router.post("/", response_model=ExpenseSchema)
-def create_expense(
+async def create_expense(
     expense: ExpenseCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new expense record"""
-    # Verify merchant exists
-    merchant = db.query(Merchant).filter(Merchant.id == expense.merchant_id).first()
-    if not merchant:
-        raise HTTPException(status_code=404, detail="Merchant not found")
-    
     db_expense = Expense(
         user_id=current_user.id,
         **expense.dict()
     )
     db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
+    await db.execute(rollup_delta(current_user.id, expense.merchant_id, expense.expense_date, expense.amount))
+    
+    # Foreign keys already guarantee the merchant (and card) exist
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Merchant or credit card not found")
+    db_expense = await db.get(Expense, db_expense.id, options=_WITH_MERCHANT, populate_existing=True)
+    invalidate_user_cache(current_user.id)
     
     return db_expense
 
-@router.get("/", response_model=List[ExpenseSchema])
-def get_expenses(
-    skip: int = 0,
-    limit: int = 100,
+@router.get("/", response_model=ExpensePage)
+async def get_expenses(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     category_id: Optional[int] = Query(None),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's expenses with optional filtering"""
-    query = db.query(Expense).filter(Expense.user_id == current_user.id)
+    """Get a page of the user's expenses with optional filtering"""
+    filtered = select(Expense).where(Expense.user_id == current_user.id)
     
     if start_date:
-        query = query.filter(Expense.expense_date >= start_date)
+        filtered = filtered.where(Expense.expense_date >= start_date)
     if end_date:
-        query = query.filter(Expense.expense_date <= end_date)
+        filtered = filtered.where(Expense.expense_date <= end_date)
     if category_id:
-        query = query.join(Merchant).filter(Merchant.category_id == category_id)
+        filtered = filtered.join(Merchant).where(Merchant.category_id == category_id)
+    
+    # COUNT(*) OVER () returns the unpaginated total alongside each row
+    query = filtered.add_columns(
+        func.count().over().label('total')
+    ).options(
+        # ExpenseSchema nests merchant -> category; load them up front
+        selectinload(Expense.merchant).selectinload(Merchant.category)
+    )
+    
+    rows = (await db.execute(query.order_by(Expense.expense_date.desc()).offset(skip).limit(limit))).all()
+    total = rows[0].total if rows else 0
+    if not rows and skip:
+        # A page past the last row has no row to carry the window count
+        total = await db.scalar(select(func.count()).select_from(filtered.subquery()))
+    
+    return {
+        "items": [row.Expense for row in rows],
+        "total": total
+    }
+
+@router.get("/export")
+async def export_expenses(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream all of the user's expenses as a JSON array"""
+    query = select(Expense).options(
+        selectinload(Expense.merchant).selectinload(Merchant.category)
+    ).where(Expense.user_id == current_user.id)
+    
+    if start_date:
+        query = query.where(Expense.expense_date >= start_date)
+    if end_date:
+        query = query.where(Expense.expense_date <= end_date)
+    
+    # Fetch in batches from a server-side cursor instead of loading every row
+    expenses = await db.stream_scalars(
+        query.order_by(Expense.expense_date.desc()).execution_options(yield_per=500)
+    )
     
-    expenses = query.order_by(Expense.expense_date.desc()).offset(skip).limit(limit).all()
-    return expenses
+    async def generate():
+        yield "["
+        separator = ""
+        async for expense in expenses:
+            yield separator + ExpenseSchema.model_validate(expense).model_dump_json()
+            separator = ","
+        yield "]"
+    
+    return StreamingResponse(generate(), media_type="application/json")
 
 @router.get("/{expense_id}", response_model=ExpenseSchema)
-def get_expense(
+async def get_expense(
     expense_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific expense"""
-    expense = db.query(Expense).filter(
-        Expense.id == expense_id,
-        Expense.user_id == current_user.id
-    ).first()
+    # Merchant and category are joined into the same query
+    expense = await db.get(Expense, expense_id, options=_WITH_MERCHANT)
     
-    if not expense:
+    if not expense or expense.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Expense not found")
     
     return expense
 
 @router.put("/{expense_id}", response_model=ExpenseSchema)
-def update_expense(
+async def update_expense(
     expense_id: int,
     expense_update: ExpenseUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an expense"""
-    expense = db.query(Expense).filter(
-        Expense.id == expense_id,
-        Expense.user_id == current_user.id
-    ).first()
+    expense = await db.get(Expense, expense_id)
     
-    if not expense:
+    if not expense or expense.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Expense not found")
     
     update_data = expense_update.dict(exclude_unset=True)
+    
+    # Move the expense between rollup rows only if it can change buckets or totals
+    rolled_up = update_data.keys() & {"merchant_id", "amount", "expense_date"}
+    if rolled_up:
+        await db.execute(rollup_delta(current_user.id, expense.merchant_id, expense.expense_date, expense.amount, sign=-1))
+    
     for field, value in update_data.items():
         setattr(expense, field, value)
     
-    db.commit()
-    db.refresh(expense)
+    if rolled_up:
+        await db.execute(rollup_delta(current_user.id, expense.merchant_id, expense.expense_date, expense.amount))
+    
+    await db.commit()
+    expense = await db.get(Expense, expense_id, options=_WITH_MERCHANT, populate_existing=True)
+    invalidate_user_cache(current_user.id)
     return expense
 
 @router.delete("/{expense_id}")
-def delete_expense(
+async def delete_expense(
     expense_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete an expense"""
-    expense = db.query(Expense).filter(
-        Expense.id == expense_id,
-        Expense.user_id == current_user.id
-    ).first()
+    expense = await db.get(Expense, expense_id)
     
-    if not expense:
+    if not expense or expense.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    db.delete(expense)
-    db.commit()
+    await db.execute(rollup_delta(current_user.id, expense.merchant_id, expense.expense_date, expense.amount, sign=-1))
+    await db.delete(expense)
+    await db.commit()
+    invalidate_user_cache(current_user.id)
     return {"message": "Expense deleted successfully"}
 
 @router.get("/summary/monthly")
-def get_monthly_summary(
+async def get_monthly_summary(
     year: int = Query(datetime.now().year),
     month: int = Query(datetime.now().month),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get monthly expense summary by category"""
-    summary = db.query(
+    summary = (await db.execute(select(
         Category.name.label('category'),
         func.sum(Expense.amount).label('total_amount'),
         func.count(Expense.id).label('transaction_count')
@@ -137,13 +248,15 @@ def get_monthly_summary(
         Merchant, Expense.merchant_id == Merchant.id
     ).join(
         Category, Merchant.category_id == Category.id
-    ).filter(
+    ).where(
         Expense.user_id == current_user.id,
         extract('year', Expense.expense_date) == year,
         extract('month', Expense.expense_date) == month
-    ).group_by(Category.id, Category.name).all()
+    ).group_by(Category.id, Category.name))).all()
     
-    total_spending = sum(item.total_amount for item in summary)
+    amounts = np.fromiter((float(item.total_amount) for item in summary), dtype=np.float64, count=len(summary))
+    total_spending = float(amounts.sum())
+    percentages = amounts * (100.0 / total_spending) if total_spending > 0 else np.zeros_like(amounts)
     
     result = {
         "year": year,
@@ -152,115 +265,91 @@ def get_monthly_summary(
         "categories": [
             {
                 "category": item.category,
-                "total_amount": item.total_amount,
+                "total_amount": float(amount),
                 "transaction_count": item.transaction_count,
-                "percentage": (item.total_amount / total_spending * 100) if total_spending > 0 else 0
+                "percentage": float(percentage)
             }
-            for item in summary
+            for item, amount, percentage in zip(summary, amounts, percentages)
         ]
     }
     
     return result
 
 @router.get("/merchants/", response_model=List[MerchantSchema])
-def get_merchants(
+async def get_merchants(
     category_id: Optional[int] = Query(None),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get available merchants for expense tracking"""
-    query = db.query(Merchant)
+    query = select(
+        Merchant.id,
+        Merchant.name,
+        Merchant.category_id,
+        Merchant.mcc_code,
+        Merchant.logo_url,
+        Category.name.label('category_name'),
+        Category.description.label('category_description'),
+        Category.icon.label('category_icon')
+    ).join(Category, Merchant.category_id == Category.id)
     
     if category_id:
-        query = query.filter(Merchant.category_id == category_id)
+        query = query.where(Merchant.category_id == category_id)
     if search:
-        query = query.filter(Merchant.name.ilike(f"%{search}%"))
+        query = query.where(Merchant.name.ilike(f"%{search}%"))
     
-    merchants = query.order_by(Merchant.name).all()
-    return merchants
+    return [
+        {
+            "id": merchant.id,
+            "name": merchant.name,
+            "category_id": merchant.category_id,
+            "mcc_code": merchant.mcc_code,
+            "logo_url": merchant.logo_url,
+            "category": {
+                "id": merchant.category_id,
+                "name": merchant.category_name,
+                "description": merchant.category_description,
+                "icon": merchant.category_icon
+            }
+        }
+        for merchant in (await db.execute(query.order_by(Merchant.name))).all()
+    ]
 
 @router.get("/categories/", response_model=List[CategorySchema])
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
     """Get all expense categories"""
-    categories = db.query(Category).order_by(Category.name).all()
+    categories = (await db.execute(select(
+        Category.id, Category.name, Category.description, Category.icon
+    ).order_by(Category.name))).all()
     return categories
 
 @router.post("/initialize-malaysian-merchants")
-def initialize_malaysian_merchants(db: Session = Depends(get_db)):
+async def initialize_malaysian_merchants(db: AsyncSession = Depends(get_async_db)):
     """Initialize Malaysian merchants and categories"""
     
-    # Check if data already exists
-    existing_categories = db.query(Category).count()
-    if existing_categories > 0:
+    # Check if data already exists (EXISTS stops at the first row)
+    if await db.scalar(select(exists().select_from(Category))):
         return {"message": "Merchants and categories already initialized"}
     
-    # Categories and their merchants
-    categories_data = {
-        "Dining": [
-            "McDonald's", "KFC", "Pizza Hut", "Burger King", "Subway",
-            "Starbucks", "Old Town White Coffee", "Secret Recipe",
-            "Sushi King", "Sakae Sushi", "Local Restaurant"
-        ],
-        "Groceries": [
-            "AEON", "Tesco", "Giant", "Jaya Grocer", "Cold Storage",
-            "Village Grocer", "Mercato", "Ben's Independent Grocer",
-            "NSK Trade City", "Econsave"
-        ],
-        "Petrol": [
-            "Shell", "Petronas", "BHP", "Caltex", "Esso"
-        ],
-        "E-commerce": [
-            "Shopee", "Lazada", "Zalora", "PG Mall", "11street",
-            "Hermo", "FashionValet", "Mudah.my"
-        ],
-        "Transportation": [
-            "Grab", "Touch 'n Go", "MyRapid", "KTM", "MRT",
-            "LRT", "Taxi", "Bus"
-        ],
-        "Entertainment": [
-            "GSC", "TGV", "MBO", "Netflix", "Spotify",
-            "Disney+", "Astro", "Gaming"
-        ],
-        "Bills & Utilities": [
-            "TNB", "Syabas", "Indah Water", "Astro", "Maxis",
-            "Celcom", "Digi", "U Mobile", "TIME", "Unifi"
-        ],
-        "Healthcare": [
-            "Guardian", "Watsons", "Caring", "Hospital",
-            "Clinic", "Pharmacy"
-        ],
-        "Shopping": [
-            "Pavilion KL", "KLCC", "Mid Valley", "1 Utama",
-            "Sunway Pyramid", "IOI City Mall", "The Gardens"
-        ],
-        "Travel": [
-            "AirAsia", "Malaysia Airlines", "Agoda", "Booking.com",
-            "Hotels.com", "Airbnb", "Hotel"
+    # Create all categories in one statement, reading back their IDs
+    category_ids = dict((await db.execute(
+        insert(Category).returning(Category.name, Category.id),
+        [
+            {"name": category_name, "description": f"{category_name} related expenses"}
+            for category_name in MALAYSIAN_MERCHANTS
         ]
-    }
-    
-    # Create categories and merchants
-    for category_name, merchants in categories_data.items():
-        # Create category
-        category = Category(
-            name=category_name,
-            description=f"{category_name} related expenses"
-        )
-        db.add(category)
-        db.flush()  # Get the ID
-        
-        # Create merchants for this category
-        for merchant_name in merchants:
-            merchant = Merchant(
-                name=merchant_name,
-                category_id=category.id
-            )
-            db.add(merchant)
+    )).all())
     
-    db.commit()
+    # Create all merchants in one statement
+    await db.execute(insert(Merchant), [
+        {"name": merchant_name, "category_id": category_ids[category_name]}
+        for category_name, merchants in MALAYSIAN_MERCHANTS.items()
+        for merchant_name in merchants
+    ])
+    await db.commit()
     
-    total_categories = len(categories_data)
-    total_merchants = sum(len(merchants) for merchants in categories_data.values())
+    total_categories = len(MALAYSIAN_MERCHANTS)
+    total_merchants = sum(len(merchants) for merchants in MALAYSIAN_MERCHANTS.values())
     
     return {
         "message": f"Successfully initialized {total_categories} categories and {total_merchants} merchants"
@@ -1,8 +1,10 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from typing import Annotated, List
+from pydantic import BeforeValidator
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User
 from app.schemas import (
     RecommendationRequest, 
@@ -10,21 +12,29 @@ from app.schemas import (
     CardCombination
 )
 from app.core.security import get_current_active_user
-from app.services.recommendation_engine import RecommendationEngine
+from app.core.cache import cache_json_response
+from app.services.recommendation_engine import RecommendationEngine, annual_spending
 
 router = APIRouter()
 
+def _split_card_ids(value):
+    """Accept both ?card_ids=1,2,3 and repeated ?card_ids=1&card_ids=2"""
+    # A missing parameter arrives undefined; let min_length reject it
+    if not isinstance(value, list):
+        return []
+    return [part.strip() for item in value for part in item.split(",")]
+
 @router.post("/optimize", response_model=RecommendationResponse)
-def get_card_recommendations(
+async def get_card_recommendations(
     request: RecommendationRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get optimized credit card combination recommendations"""
     engine = RecommendationEngine(db)
     
     # Get spending pattern
-    spending_pattern = engine.get_user_spending_pattern(current_user.id)
+    spending_pattern = await engine.get_user_spending_pattern(current_user.id)
     
     if not spending_pattern:
         raise HTTPException(
@@ -33,7 +43,7 @@ def get_card_recommendations(
         )
     
     # Get optimized combinations
-    recommendations = engine.optimize_card_combination(current_user.id)
+    recommendations = await engine.optimize_card_combination(current_user.id)
     
     if not recommendations:
         raise HTTPException(
@@ -46,43 +56,49 @@ def get_card_recommendations(
     current_rewards = 0.0  # This would be calculated based on user's current cards
     potential_savings = best_combination.net_benefit - current_rewards
     
-    analysis_period = request.analysis_period or datetime.now().strftime("%Y-%m")
+    now = datetime.now()
+    analysis_period = request.analysis_period or now.strftime("%Y-%m")
     
-    return RecommendationResponse(
+    response = RecommendationResponse(
         user_id=current_user.id,
         analysis_period=analysis_period,
         current_spending=spending_pattern,
         recommendations=recommendations,
         potential_savings=potential_savings,
-        generated_at=datetime.now()
+        generated_at=now
     )
+    # Already validated above; serialise straight to JSON in pydantic-core instead of
+    # letting response_model dump, re-validate and serialise it a second time
+    return Response(response.model_dump_json(), media_type="application/json")
 
 @router.get("/purchase-advice")
-def get_purchase_advice(
+async def get_purchase_advice(
     merchant_id: int = Query(..., description="ID of the merchant"),
     amount: float = Query(..., description="Purchase amount"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get recommendation for which card to use for a specific purchase"""
     engine = RecommendationEngine(db)
     
-    recommendation = engine.get_purchase_recommendation(
+    recommendation = await engine.get_purchase_recommendation(
         current_user.id, merchant_id, amount
     )
     
     return recommendation
 
 @router.get("/spending-analysis")
-def get_spending_analysis(
+@cache_json_response
+async def get_spending_analysis(
+    request: Request,
     months: int = Query(3, description="Number of months to analyze"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed spending analysis for the user"""
     engine = RecommendationEngine(db)
     
-    spending_pattern = engine.get_user_spending_pattern(current_user.id, months)
+    spending_pattern = await engine.get_user_spending_pattern(current_user.id, months)
     
     if not spending_pattern:
         return {
@@ -114,25 +130,22 @@ def get_spending_analysis(
     }
 
 @router.post("/simulate-card")
-def simulate_card_performance(
+async def simulate_card_performance(
     card_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Simulate how a specific card would perform with user's spending pattern"""
     from app.db.models import CreditCard
     
     # Get the card
-    card = db.query(CreditCard).filter(
-        CreditCard.id == card_id,
-        CreditCard.is_active == True
-    ).first()
+    card = await db.get(CreditCard, card_id)
     
-    if not card:
+    if not card or not card.is_active:
         raise HTTPException(status_code=404, detail="Credit card not found")
     
     engine = RecommendationEngine(db)
-    spending_pattern = engine.get_user_spending_pattern(current_user.id)
+    spending_pattern = await engine.get_user_spending_pattern(current_user.id)
     
     if not spending_pattern:
         raise HTTPException(
@@ -141,9 +154,9 @@ def simulate_card_performance(
         )
     
     # Calculate rewards for this specific card
-    card_rewards = engine.calculate_card_rewards(card, spending_pattern)
+    card_rewards = await engine.calculate_card_rewards(card, spending_pattern)
     
-    total_annual_spending = sum(amount * 12 for amount in spending_pattern.values())
+    total_annual_spending = float(annual_spending(spending_pattern).sum())
     net_benefit = card_rewards['total_cashback'] - card.annual_fee
     
     return {
@@ -164,33 +177,29 @@ def simulate_card_performance(
     }
 
 @router.get("/card-comparison")
-def compare_cards(
-    card_ids: str = Query(..., description="Comma-separated card IDs to compare"),
+@cache_json_response
+async def compare_cards(
+    request: Request,
+    card_ids: Annotated[List[int], BeforeValidator(_split_card_ids), Query(
+        min_length=1, max_length=5, description="Card IDs to compare (comma-separated or repeated, at most 5)"
+    )],
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Compare multiple cards based on user's spending pattern"""
     from app.db.models import CreditCard
     
-    try:
-        card_id_list = [int(id.strip()) for id in card_ids.split(",")]
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid card IDs format")
-    
-    if len(card_id_list) > 5:
-        raise HTTPException(status_code=400, detail="Maximum 5 cards can be compared")
-    
     # Get cards
-    cards = db.query(CreditCard).filter(
-        CreditCard.id.in_(card_id_list),
+    cards = (await db.scalars(select(CreditCard).where(
+        CreditCard.id.in_(card_ids),
         CreditCard.is_active == True
-    ).all()
+    ))).all()
     
-    if len(cards) != len(card_id_list):
+    if len(cards) != len(card_ids):
         raise HTTPException(status_code=404, detail="One or more cards not found")
     
     engine = RecommendationEngine(db)
-    spending_pattern = engine.get_user_spending_pattern(current_user.id)
+    spending_pattern = await engine.get_user_spending_pattern(current_user.id)
     
     if not spending_pattern:
         raise HTTPException(
@@ -200,8 +209,10 @@ def compare_cards(
     
     comparison_results = []
     
-    for card in cards:
-        card_rewards = engine.calculate_card_rewards(card, spending_pattern)
+    # Annualised spend and reward-table columns are computed once for all cards
+    all_card_rewards = await engine.calculate_cards_rewards(cards, spending_pattern)
+    
+    for card, card_rewards in zip(cards, all_card_rewards):
         net_benefit = card_rewards['total_cashback'] - card.annual_fee
         
         comparison_results.append({
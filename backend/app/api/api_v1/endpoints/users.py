@@ -1,23 +1,28 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.db.models import User, UserCard, CreditCard
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.db.database import get_async_db
+from app.db.models import User, UserCard
 from app.schemas import User as UserSchema, UserUpdate, UserCard as UserCardSchema, UserCardCreate
 from app.core.security import get_current_active_user
+from app.core.cache import invalidate_user_cache
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
     """Get current user information"""
     return current_user
 
 @router.put("/me", response_model=UserSchema)
-def update_current_user(
+async def update_current_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user information"""
     update_data = user_update.dict(exclude_unset=True)
@@ -25,71 +30,78 @@ def update_current_user(
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     return current_user
 
 @router.get("/me/cards", response_model=List[UserCardSchema])
-def get_user_cards(
+async def get_user_cards(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's credit cards"""
-    user_cards = db.query(UserCard).filter(
+    # UserCardSchema nests the credit card; load them all in one extra query
+    user_cards = (await db.scalars(select(UserCard).options(
+        selectinload(UserCard.credit_card)
+    ).where(
         UserCard.user_id == current_user.id,
         UserCard.is_active == True
-    ).all()
+    ))).all()
     return user_cards
 
 @router.post("/me/cards", response_model=UserCardSchema)
-def add_user_card(
+async def add_user_card(
     card_data: UserCardCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a credit card to user's wallet"""
-    # Check if card exists
-    card = db.query(CreditCard).filter(CreditCard.id == card_data.credit_card_id).first()
-    if not card:
-        raise HTTPException(status_code=404, detail="Credit card not found")
+    # One statement: the foreign key checks the card exists and the unique
+    # partial index on active wallet rows turns a duplicate into no row
+    stmt = pg_insert(UserCard).values(
+        user_id=current_user.id,
+        credit_card_id=card_data.credit_card_id
+    ).on_conflict_do_nothing(
+        index_elements=[UserCard.user_id, UserCard.credit_card_id],
+        index_where=UserCard.is_active
+    ).returning(UserCard)
     
-    # Check if user already has this card
-    existing_user_card = db.query(UserCard).filter(
-        UserCard.user_id == current_user.id,
-        UserCard.credit_card_id == card_data.credit_card_id,
-        UserCard.is_active == True
-    ).first()
+    try:
+        # Lazy loads are unavailable under asyncio; load the nested card explicitly
+        user_card = await db.scalar(
+            select(UserCard).from_statement(stmt).options(selectinload(UserCard.credit_card))
+        )
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Credit card not found")
     
-    if existing_user_card:
+    if not user_card:
         raise HTTPException(status_code=400, detail="Card already added to your wallet")
     
-    user_card = UserCard(
-        user_id=current_user.id,
-        credit_card_id=card_data.credit_card_id
-    )
-    db.add(user_card)
-    db.commit()
-    db.refresh(user_card)
+    await db.commit()
+    # Recommendations depend on which cards the user already holds
+    invalidate_user_cache(current_user.id)
     
     return user_card
 
 @router.delete("/me/cards/{card_id}")
-def remove_user_card(
+async def remove_user_card(
     card_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove a credit card from user's wallet"""
-    user_card = db.query(UserCard).filter(
+    user_card = await db.scalar(select(UserCard).where(
         UserCard.user_id == current_user.id,
         UserCard.credit_card_id == card_id,
         UserCard.is_active == True
-    ).first()
+    ))
     
     if not user_card:
         raise HTTPException(status_code=404, detail="Card not found in your wallet")
     
     user_card.is_active = False
-    db.commit()
+    await db.commit()
+    invalidate_user_cache(current_user.id)
     
     return {"message": "Card removed from wallet successfully"}
\ No newline at end of file
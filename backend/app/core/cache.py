@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+from copy import copy
+from functools import wraps
+from threading import Lock
+from typing import Awaitable, Callable, Dict
+from cachetools import TTLCache
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from app.core.config import settings
+
+_MISSING = object()
+
+_responses = TTLCache(maxsize=10_000, ttl=settings.ANALYTICS_CACHE_TTL_SECONDS)
+_user_versions: Dict[int, int] = {}
+_catalog_version = 0
+_lock = Lock()
+_inflight: Dict[tuple, asyncio.Future] = {}
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Invalidate all cached responses for a user"""
+    # Entries keyed on the old version are never read again and expire via TTL
+    with _lock:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+def invalidate_catalog_cache() -> None:
+    """Invalidate all cached responses and the reward table after the credit card catalogue changes"""
+    global _catalog_version
+    with _lock:
+        _catalog_version += 1
+
+def catalog_version() -> int:
+    """Current credit card catalogue version"""
+    return _catalog_version
+
+def _lookup(func: Callable, user_id: int, params: tuple):
+    with _lock:
+        key = (func.__qualname__, user_id, _user_versions.get(user_id, 0), _catalog_version, params)
+        return key, _responses.get(key, _MISSING)
+
+def _endpoint_lookup(func: Callable, kwargs: dict):
+    params = tuple(sorted(
+        (name, value) for name, value in kwargs.items()
+        if name not in ("current_user", "db")
+    ))
+    return _lookup(func, kwargs["current_user"].id, params)
+
+def _store(key: tuple, response) -> None:
+    with _lock:
+        _responses[key] = response
+
+def cache_per_user(func: Callable) -> Callable:
+    """Cache an async endpoint's response per user and query parameters"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        key, response = _endpoint_lookup(func, kwargs)
+        if response is _MISSING:
+            response = await func(*args, **kwargs)
+            _store(key, response)
+        return response
+
+    return wrapper
+
+def _etag(key: tuple) -> str:
+    return '"%s"' % hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in header.split(","))
+
+def cache_json_response(func: Callable) -> Callable:
+    """Cache an async endpoint's encoded JSON per user and query parameters, served with an ETag"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        # List parameters are order-insensitive here; key them as sorted tuples
+        params = tuple(sorted(
+            (name, tuple(sorted(value)) if isinstance(value, list) else value)
+            for name, value in kwargs.items()
+            if name not in ("request", "current_user", "db")
+        ))
+        key, body = _lookup(func, kwargs["current_user"].id, params)
+        etag = _etag(key)
+
+        # Versions are per process; only trust a client's ETag while this process still
+        # holds the body, so staleness stays bounded by the TTL like every other entry
+        if body is not _MISSING and _etag_matches(kwargs["request"], etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if body is _MISSING:
+            body = ORJSONResponse(await func(*args, **kwargs)).body
+            _store(key, body)
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    return wrapper
+
+async def _single_flight(key: tuple, compute: Callable[[], Awaitable]):
+    """Run compute() once for concurrent callers with the same key and cache the result"""
+    pending = _inflight.get(key)
+    if pending is not None:
+        try:
+            # Shielded so a follower going away does not cancel the shared run
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # Take over if the leader was cancelled; re-raise our own cancellation
+            if not pending.done() or not isinstance(pending.exception(), asyncio.CancelledError):
+                raise
+            return await _single_flight(key, compute)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await compute()
+    except BaseException as exc:
+        future.set_exception(exc)
+        # Followers still receive it; only silence the "never retrieved" warning
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
+
+    _store(key, result)
+    future.set_result(result)
+    return result
+
+def cache_user_method(func: Callable) -> Callable:
+    """Cache an async method's result per user_id and remaining positional arguments"""
+    @wraps(func)
+    async def wrapper(self, user_id: int, *args):
+        key, result = _lookup(func, user_id, args)
+        if result is _MISSING:
+            result = await _single_flight(key, lambda: func(self, user_id, *args))
+        # Hand out copies so callers can't mutate the cached value
+        return copy(result)
+
+    return wrapper
\ No newline at end of file
@@ -1,16 +1,47 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+# Shared pool settings; runaway queries are cancelled server-side instead of pinning a worker
+_pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS
+)
+_timeouts = {
+    "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+    "lock_timeout": str(settings.DB_LOCK_TIMEOUT_MS)
+}
+
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    connect_args={"options": " ".join(f"-c {name}={value}" for name, value in _timeouts.items())},
+    **_pool_options
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for endpoints that should not tie up a worker thread on I/O
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+    connect_args={"server_settings": _timeouts},
+    **_pool_options
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+# Deliberately sync: only the auth endpoints use this, since password hashing is
+# CPU-bound and belongs in the threadpool. init_data opens SessionLocal directly
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
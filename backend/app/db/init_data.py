@@ -1,12 +1,14 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app.db.models import CreditCard, CardReward, Category, Merchant, CardType, RewardType
 from app.db.database import SessionLocal
+from app.services.spending_rollup import rebuild_rollup
 
 def initialize_malaysian_credit_cards_and_rewards(db: Session):
     """Initialize Malaysian credit cards with their reward structures"""
     
     # Check if data already exists
-    if db.query(CreditCard).count() > 0:
+    if db.query(db.query(CreditCard).exists()).scalar():
         print("Credit cards already initialized")
         return
     
@@ -25,12 +27,8 @@ def initialize_malaysian_credit_cards_and_rewards(db: Session):
         {"name": "General", "description": "All other purchases", "icon": "💳"}
     ]
     
-    categories = {}
-    for cat_data in categories_data:
-        category = Category(**cat_data)
-        db.add(category)
-        db.flush()
-        categories[cat_data["name"]] = category
+    db.bulk_insert_mappings(Category, categories_data)
+    categories = dict(db.query(Category.name, Category.id).all())
     
     # Malaysian Credit Cards with detailed reward structures
     cards_data = [
@@ -155,24 +153,21 @@ def initialize_malaysian_credit_cards_and_rewards(db: Session):
         }
     ]
     
-    # Create cards and their rewards
-    for card_data in cards_data:
-        # Create credit card
-        card = CreditCard(**card_data["card"])
-        db.add(card)
-        db.flush()
-        
-        # Create card rewards
-        for reward_data in card_data["rewards"]:
-            category_name = reward_data.pop("category")
-            category = categories[category_name]
-            
-            card_reward = CardReward(
-                credit_card_id=card.id,
-                category_id=category.id,
-                **reward_data
-            )
-            db.add(card_reward)
+    # Create cards in one batch, then read back their generated ids by name
+    db.bulk_insert_mappings(CreditCard, [card_data["card"] for card_data in cards_data])
+    card_ids = dict(db.query(CreditCard.name, CreditCard.id).all())
+    
+    # Create all card rewards in one batch
+    reward_rows = [
+        {
+            "credit_card_id": card_ids[card_data["card"]["name"]],
+            "category_id": categories[reward_data["category"]],
+            **{key: value for key, value in reward_data.items() if key != "category"}
+        }
+        for card_data in cards_data
+        for reward_data in card_data["rewards"]
+    ]
+    db.bulk_insert_mappings(CardReward, reward_rows)
     
     db.commit()
     print(f"Successfully initialized {len(cards_data)} Malaysian credit cards with rewards")
@@ -180,12 +175,12 @@ def initialize_malaysian_credit_cards_and_rewards(db: Session):
 def initialize_malaysian_merchants(db: Session):
     """Initialize Malaysian merchants"""
     
-    if db.query(Merchant).count() > 0:
+    if db.query(db.query(Merchant).exists()).scalar():
         print("Merchants already initialized")
         return
     
     # Get categories
-    categories = {cat.name: cat for cat in db.query(Category).all()}
+    categories = dict(db.query(Category.name, Category.id).all())
     
     merchants_data = {
         "Dining": [
@@ -231,20 +226,27 @@ def initialize_malaysian_merchants(db: Session):
         ]
     }
     
-    total_merchants = 0
-    for category_name, merchant_names in merchants_data.items():
-        category = categories.get(category_name)
-        if category:
-            for merchant_name in merchant_names:
-                merchant = Merchant(
-                    name=merchant_name,
-                    category_id=category.id
-                )
-                db.add(merchant)
-                total_merchants += 1
+    merchant_rows = [
+        {"name": merchant_name, "category_id": categories[category_name]}
+        for category_name, merchant_names in merchants_data.items()
+        if category_name in categories
+        for merchant_name in merchant_names
+    ]
+    db.bulk_insert_mappings(Merchant, merchant_rows)
     
     db.commit()
-    print(f"Successfully initialized {total_merchants} Malaysian merchants")
+    print(f"Successfully initialized {len(merchant_rows)} Malaysian merchants")
+
+def rebuild_monthly_rollup(db: Session):
+    """Recompute the monthly spending rollup from existing expenses"""
+    # The full-table rebuild outlasts the per-connection request timeouts; lift them
+    # for this transaction only so it is not cancelled halfway with an empty rollup
+    db.execute(text("SET LOCAL statement_timeout = 0"))
+    db.execute(text("SET LOCAL lock_timeout = 0"))
+    for statement in rebuild_rollup():
+        db.execute(statement)
+    db.commit()
+    print("Monthly spending rollup rebuilt")
 
 def main():
     """Initialize all data"""
@@ -253,6 +255,7 @@ def main():
         print("Initializing Malaysian credit card recommender data...")
         initialize_malaysian_credit_cards_and_rewards(db)
         initialize_malaysian_merchants(db)
+        rebuild_monthly_rollup(db)
         print("Data initialization completed successfully!")
     except Exception as e:
         print(f"Error during initialization: {e}")
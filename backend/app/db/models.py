@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -47,6 +47,14 @@ class CreditCard(Base):
     # Relationships
     card_rewards = relationship("CardReward", back_populates="credit_card")
     user_cards = relationship("UserCard", back_populates="credit_card")
+    
+    __table_args__ = (
+        Index("ix_cc_active", "id", postgresql_where=text("is_active")),
+        # Trigram index so bank ILIKE '%...%' searches can use an index. Autogenerate
+        # does not emit CREATE EXTENSION: add "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        # to the migration ahead of this index
+        Index("ix_cc_bank_trgm", "bank", postgresql_using="gin", postgresql_ops={"bank": "gin_trgm_ops"}),
+    )
 
 class Category(Base):
     __tablename__ = "categories"
@@ -72,6 +80,10 @@ class Merchant(Base):
     # Relationships
     category = relationship("Category", back_populates="merchants")
     expenses = relationship("Expense", back_populates="merchant")
+    
+    __table_args__ = (
+        Index("ix_merchant_category", "category_id"),
+    )
 
 class CardReward(Base):
     __tablename__ = "card_rewards"
@@ -90,6 +102,11 @@ class CardReward(Base):
     # Relationships
     credit_card = relationship("CreditCard", back_populates="card_rewards")
     category = relationship("Category", back_populates="card_rewards")
+    
+    # Reward lookups (per card, purchase advice joins) only ever read active rows
+    __table_args__ = (
+        Index("ix_card_reward_card_active", "credit_card_id", postgresql_where=text("is_active")),
+    )
 
 class UserCard(Base):
     __tablename__ = "user_cards"
@@ -103,6 +120,12 @@ class UserCard(Base):
     # Relationships
     user = relationship("User", back_populates="user_cards")
     credit_card = relationship("CreditCard", back_populates="user_cards")
+    
+    # Wallet lookups always filter on user (and card) among active rows; a card
+    # can be in a wallet at most once, but removed (inactive) rows are kept
+    __table_args__ = (
+        Index("ix_user_cards_user_active", "user_id", "credit_card_id", unique=True, postgresql_where=text("is_active")),
+    )
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -121,6 +144,28 @@ class Expense(Base):
     # Relationships
     user = relationship("User", back_populates="expenses")
     merchant = relationship("Merchant", back_populates="expenses")
+    
+    # Analytics queries filter on user + date range and join through merchant
+    __table_args__ = (
+        Index("ix_expense_user_date", "user_id", "expense_date"),
+        Index("ix_expense_merchant", "merchant_id"),
+    )
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_spending_rollup"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    total = Column(Float, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    
+    # One row per user, month and category; kept in step with expense writes
+    __table_args__ = (
+        Index("ix_rollup_user_month_category", "user_id", "year", "month", "category_id", unique=True),
+    )
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
@@ -1,13 +1,20 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import DBAPIError
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.services.optimizer_kernels import warm_up
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Malaysian Credit Card Recommender API",
     description="API for optimizing credit card usage based on Malaysian spending patterns",
     version="1.0.0",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=ORJSONResponse
 )
 
 # Set up CORS
@@ -21,6 +28,24 @@ app.add_middleware(
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+def warm_up_optimizer():
+    # Compile the Numba kernels before the first request pays for it
+    warm_up()
+
+# query_canceled (statement_timeout) and lock_not_available (lock_timeout)
+_TIMEOUT_SQLSTATES = {"57014", "55P03"}
+
+@app.exception_handler(DBAPIError)
+async def database_error_handler(request: Request, exc: DBAPIError):
+    # psycopg2 raises these as OperationalError, asyncpg as a plain DBAPIError;
+    # both drivers expose the SQLSTATE as pgcode
+    if getattr(exc.orig, "pgcode", None) in _TIMEOUT_SQLSTATES:
+        return ORJSONResponse(status_code=504, content={"detail": "Database request timed out"})
+    # Any other database error is a plain 500, logged once here
+    logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+
 @app.get("/")
 async def root():
     return {
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -31,8 +31,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Credit Card Schemas
 class CreditCardBase(BaseModel):
@@ -52,8 +51,7 @@ class CreditCard(CreditCardBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Category Schemas
 class CategoryBase(BaseModel):
@@ -67,8 +65,7 @@ class CategoryCreate(CategoryBase):
 class Category(CategoryBase):
     id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Merchant Schemas
 class MerchantBase(BaseModel):
@@ -84,8 +81,7 @@ class Merchant(MerchantBase):
     id: int
     category: Category
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Card Reward Schemas
 class CardRewardBase(BaseModel):
@@ -105,8 +101,7 @@ class CardReward(CardRewardBase):
     id: int
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Expense Schemas
 class ExpenseBase(BaseModel):
@@ -132,8 +127,11 @@ class Expense(ExpenseBase):
     created_at: datetime
     merchant: Merchant
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ExpensePage(BaseModel):
+    items: List[Expense]
+    total: int
 
 # User Card Schemas
 class UserCardBase(BaseModel):
@@ -149,8 +147,7 @@ class UserCard(UserCardBase):
     is_active: bool
     credit_card: CreditCard
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Recommendation Schemas
 class RecommendationRequest(BaseModel):
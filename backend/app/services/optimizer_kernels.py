@@ -0,0 +1,170 @@
+import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def best_reward_amounts(reward_rows, reward_columns, reward_rates, reward_caps, reward_cashback, columns, annual_amounts, num_cards):
+    """Best category-specific and general reward amount per (card, spending category)"""
+    # One extra all-zero row for cards without any rewards (row index -1)
+    shape = (num_cards + 1, columns.shape[0])
+    specific = np.zeros(shape)
+    specific_cashback = np.ones(shape, dtype=np.bool_)
+    general = np.zeros(shape)
+    general_cashback = np.ones(shape, dtype=np.bool_)
+    
+    # Rewards are ordered by id; strict ">" keeps the first of equal amounts
+    for r in range(reward_rows.shape[0]):
+        i = reward_rows[r]
+        for k in range(columns.shape[0]):
+            amount = min(annual_amounts[k], reward_caps[r]) * reward_rates[r]
+            if reward_columns[r] < 0:
+                if amount > general[i, k]:
+                    general[i, k] = amount
+                    general_cashback[i, k] = reward_cashback[r]
+            elif reward_columns[r] == columns[k]:
+                if amount > specific[i, k]:
+                    specific[i, k] = amount
+                    specific_cashback[i, k] = reward_cashback[r]
+    
+    return specific, specific_cashback, general, general_cashback
+
+@njit(cache=True)
+def _ranks_before(net, size, combo, other_net, other_size, other_combo):
+    """Ranking order: higher net benefit, then fewer cards, then lower card indices"""
+    if net != other_net:
+        return net > other_net
+    if size != other_size:
+        return size < other_size
+    for j in range(size):
+        if combo[j] != other_combo[j]:
+            return combo[j] < other_combo[j]
+    return False
+
+@njit(cache=True)
+def top_combinations(specific, specific_cashback, general, general_cashback, fees, point_value, max_cards, top_k):
+    """Best top_k combinations of up to max_cards cards, found by depth-first branch and bound"""
+    num_cards, num_categories = specific.shape
+    max_cards = min(max_cards, num_cards)
+    
+    # Most a card can add to a category, whichever of its rewards a combination ends up using
+    value = np.empty((num_cards, num_categories))
+    for c in range(num_cards):
+        for k in range(num_categories):
+            s = specific[c, k] if specific_cashback[c, k] else specific[c, k] * point_value
+            g = general[c, k] if general_cashback[c, k] else general[c, k] * point_value
+            value[c, k] = max(s, g)
+    
+    # Visit strong standalone cards first so the top_k fills with good bounds early
+    standalone = np.empty(num_cards)
+    for c in range(num_cards):
+        standalone[c] = value[c].sum() - fees[c]
+    order = np.argsort(-standalone, kind="mergesort")
+    
+    # suffix_value[p, k]: most any card at search position p or later can add to category k
+    suffix_value = np.zeros((num_cards + 1, num_categories))
+    for p in range(num_cards - 1, -1, -1):
+        for k in range(num_categories):
+            suffix_value[p, k] = max(suffix_value[p + 1, k], value[order[p], k])
+    
+    top_net = np.empty(top_k)
+    top_size = np.zeros(top_k, dtype=np.intp)
+    top_combo = np.full((top_k, max_cards), -1, dtype=np.intp)
+    top_cashback = np.empty(top_k)
+    top_points = np.empty(top_k)
+    count = 0
+    
+    # Depth-first over search positions; path_value/path_fee hold the bound inputs per depth
+    position = np.zeros(max_cards + 1, dtype=np.intp)
+    path_value = np.zeros((max_cards + 1, num_categories))
+    path_fee = np.zeros(max_cards + 1)
+    combo = np.empty(max_cards, dtype=np.intp)
+    depth = 0
+    while depth >= 0:
+        p = position[depth]
+        if p >= num_cards or max_cards == 0:
+            depth -= 1
+            if depth >= 0:
+                position[depth] += 1
+            continue
+    
+        # Upper bound for every combination extending the current path with the card at p;
+        # fees are non-negative, so more cards never lower the fee part of the bound
+        if count == top_k:
+            bound = -(path_fee[depth] + fees[order[p]])
+            for k in range(num_categories):
+                bound += max(path_value[depth, k], suffix_value[p, k])
+            # Only prune strictly below the cut-off (with slack for summation order) to keep ties exact
+            cutoff = top_net[top_k - 1]
+            if bound < cutoff - 1e-9 * max(1.0, abs(cutoff)):
+                position[depth] += 1
+                continue
+    
+        c = order[p]
+        path_fee[depth + 1] = path_fee[depth] + fees[c]
+        for k in range(num_categories):
+            path_value[depth + 1, k] = max(path_value[depth, k], value[c, k])
+    
+        # Score the combination in card-index order, exactly as a full enumeration would
+        size = depth + 1
+        combo[depth] = c
+        cards = np.sort(combo[:size])
+        cashback = 0.0
+        points = 0.0
+        for k in range(num_categories):
+            # Best category-specific reward across the combination, in card order
+            best = 0.0
+            is_cashback = True
+            for j in range(size):
+                if specific[cards[j], k] > best:
+                    best = specific[cards[j], k]
+                    is_cashback = specific_cashback[cards[j], k]
+    
+            # Fall back to general rewards only if no card rewards this category
+            if best == 0.0:
+                for j in range(size):
+                    if general[cards[j], k] > best:
+                        best = general[cards[j], k]
+                        is_cashback = general_cashback[cards[j], k]
+    
+            if is_cashback:
+                cashback += best
+            else:
+                points += best
+        fee = 0.0
+        for j in range(size):
+            fee += fees[cards[j]]
+        net = cashback - fee + points * point_value
+    
+        # Insert into the sorted top_k, dropping the last entry when full
+        if count < top_k or _ranks_before(net, size, cards, top_net[top_k - 1], top_size[top_k - 1], top_combo[top_k - 1]):
+            i = count if count < top_k else top_k - 1
+            while i > 0 and _ranks_before(net, size, cards, top_net[i - 1], top_size[i - 1], top_combo[i - 1]):
+                top_net[i] = top_net[i - 1]
+                top_size[i] = top_size[i - 1]
+                top_combo[i] = top_combo[i - 1]
+                top_cashback[i] = top_cashback[i - 1]
+                top_points[i] = top_points[i - 1]
+                i -= 1
+            top_net[i] = net
+            top_size[i] = size
+            top_combo[i] = -1
+            top_combo[i, :size] = cards
+            top_cashback[i] = cashback
+            top_points[i] = points
+            count = min(count + 1, top_k)
+    
+        if size < max_cards and p + 1 < num_cards:
+            depth += 1
+            position[depth] = p + 1
+        else:
+            position[depth] += 1
+    
+    return top_combo[:count], top_size[:count], top_cashback[:count], top_points[:count]
+
+def warm_up() -> None:
+    """Compile the kernels ahead of the first request"""
+    rows = np.zeros(1, dtype=np.intp)
+    specific, specific_cashback, general, general_cashback = best_reward_amounts(
+        rows, rows, np.ones(1), np.full(1, np.inf), np.ones(1, dtype=np.bool_),
+        rows, np.ones(1), 1
+    )
+    top_combinations(specific[:1], specific_cashback[:1], general[:1], general_cashback[:1], np.zeros(1), 0.01, 1, 1)
\ No newline at end of file
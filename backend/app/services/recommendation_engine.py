@@ -1,264 +1,215 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, exists, func, or_, select
 from app.db.models import (
-    User, Expense, CreditCard, CardReward, Merchant, Category, UserCard
+    Expense, CreditCard, CardReward, Merchant, Category, UserCard
 )
-from app.schemas import CardCombination, RecommendationResponse
+from app.schemas import CardCombination, CreditCard as CreditCardSchema
+from app.core.cache import cache_user_method
+from app.services.reward_table import get_reward_table, REWARD_TYPES, CASHBACK
+from app.services.optimizer_kernels import best_reward_amounts, top_combinations
 import itertools
-import json
+import numpy as np
+
+# Approximate cash value of one reward point (RM 0.01)
+POINT_CASH_VALUE = 0.01
+
+def annual_spending(spending_pattern: Dict[str, float]) -> np.ndarray:
+    """Annual spend per category, in spending_pattern order"""
+    return np.fromiter(spending_pattern.values(), dtype=np.float64, count=len(spending_pattern)) * 12
 
 class RecommendationEngine:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def get_user_spending_pattern(self, user_id: int, months: int = 3) -> Dict[str, float]:
+    @cache_user_method
+    async def get_user_spending_pattern(self, user_id: int, months: int = 3) -> Dict[str, float]:
         """Analyze user's spending pattern by category over the last N months"""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=months * 30)
         
-        spending_by_category = self.db.query(
+        # Monthly average = total over the window / number of months, aggregated in SQL
+        spending_by_category = (await self.db.execute(select(
             Category.name,
-            func.avg(func.sum(Expense.amount)).label('avg_monthly_amount')
+            (func.sum(Expense.amount) / months).label('avg_monthly_amount')
         ).join(
             Merchant, Category.id == Merchant.category_id
         ).join(
             Expense, Merchant.id == Expense.merchant_id
-        ).filter(
+        ).where(
             Expense.user_id == user_id,
             Expense.expense_date >= start_date,
             Expense.expense_date <= end_date
-        ).group_by(
-            Category.id, Category.name,
-            extract('year', Expense.expense_date),
-            extract('month', Expense.expense_date)
-        ).group_by(Category.id, Category.name).all()
+        ).group_by(Category.id, Category.name))).all()
         
         return {category: float(amount) for category, amount in spending_by_category}
     
-    def calculate_card_rewards(self, card: CreditCard, spending_pattern: Dict[str, float]) -> Dict[str, float]:
+    async def calculate_card_rewards(self, card: CreditCard, spending_pattern: Dict[str, float]) -> Dict[str, float]:
         """Calculate potential rewards for a card based on spending pattern"""
-        rewards = self.db.query(CardReward).filter(
-            CardReward.credit_card_id == card.id,
-            CardReward.is_active == True
-        ).all()
-        
-        total_cashback = 0.0
-        total_points = 0.0
-        category_rewards = {}
-        
-        for category, monthly_amount in spending_pattern.items():
-            annual_amount = monthly_amount * 12
-            best_reward_rate = 0.0
-            reward_type = "cashback"
-            
-            # Find the best reward rate for this category
-            for reward in rewards:
-                if reward.category and reward.category.name == category:
-                    # Apply spending caps if any
-                    applicable_amount = annual_amount
-                    if reward.maximum_spend:
-                        applicable_amount = min(applicable_amount, reward.maximum_spend * 12)
-                    
-                    if reward.reward_rate > best_reward_rate:
-                        best_reward_rate = reward.reward_rate
-                        reward_type = reward.reward_type.value
-            
-            # If no specific category reward, check for general rewards
-            if best_reward_rate == 0.0:
-                for reward in rewards:
-                    if reward.category is None:  # General reward
-                        applicable_amount = annual_amount
-                        if reward.maximum_spend:
-                            applicable_amount = min(applicable_amount, reward.maximum_spend * 12)
-                        
-                        if reward.reward_rate > best_reward_rate:
-                            best_reward_rate = reward.reward_rate
-                            reward_type = reward.reward_type.value
-            
-            # Calculate rewards
-            reward_amount = annual_amount * best_reward_rate
-            category_rewards[category] = {
-                'amount': reward_amount,
-                'rate': best_reward_rate,
-                'type': reward_type
+        return (await self.calculate_cards_rewards([card], spending_pattern))[0]
+    
+    async def calculate_cards_rewards(self, cards: List[CreditCard], spending_pattern: Dict[str, float]) -> List[Dict[str, float]]:
+        """Calculate potential rewards for several cards against the same spending pattern"""
+        table = await get_reward_table(self.db)
+        categories = list(spending_pattern)
+        annual_amounts = annual_spending(spending_pattern)
+        
+        # Best category rate (or the general rate where there is none) as one cards x categories matrix;
+        # cards without any rewards keep a zero cashback row
+        rows = np.fromiter((table.card_index.get(card.id, -1) for card in cards), dtype=np.intp, count=len(cards))
+        known = rows >= 0
+        rates = np.zeros((len(cards), len(categories)))
+        types = np.full(rates.shape, CASHBACK, dtype=np.int8)
+        lookup = np.ix_(rows[known], table.columns(categories))
+        rates[known] = table.effective_rates[lookup]
+        types[known] = table.effective_types[lookup]
+        
+        reward_amounts = rates * annual_amounts
+        is_cashback = types == CASHBACK
+        
+        results = []
+        for card_amounts, card_rates, card_types, card_cashback in zip(reward_amounts, rates, types, is_cashback):
+            category_rewards = {
+                category: {
+                    'amount': amount,
+                    'rate': rate,
+                    'type': REWARD_TYPES[reward_type]
+                }
+                for category, amount, rate, reward_type in zip(categories, card_amounts.tolist(), card_rates.tolist(), card_types.tolist())
             }
             
-            if reward_type == "cashback":
-                total_cashback += reward_amount
-            else:
-                total_points += reward_amount
+            results.append({
+                'total_cashback': float(card_amounts[card_cashback].sum()),
+                'total_points': float(card_amounts[~card_cashback].sum()),
+                'category_breakdown': category_rewards
+            })
         
-        return {
-            'total_cashback': total_cashback,
-            'total_points': total_points,
-            'category_breakdown': category_rewards
-        }
+        return results
     
-    def optimize_card_combination(self, user_id: int, max_cards: int = 3) -> List[CardCombination]:
+    @cache_user_method
+    async def optimize_card_combination(self, user_id: int, max_cards: int = 3) -> List[CardCombination]:
         """Find the optimal combination of credit cards for maximum rewards"""
-        spending_pattern = self.get_user_spending_pattern(user_id)
+        spending_pattern = await self.get_user_spending_pattern(user_id)
         
         if not spending_pattern:
             return []
         
         # Get all available cards
-        available_cards = self.db.query(CreditCard).filter(
+        available_cards = (await self.db.scalars(select(CreditCard).where(
             CreditCard.is_active == True
-        ).all()
+        ))).all()
         
-        # Get user's current cards (if any)
-        user_cards = self.db.query(UserCard).filter(
+        # Get user's current cards (if any); their annual fees are already being paid
+        user_card_ids = set((await self.db.scalars(select(UserCard.credit_card_id).where(
             UserCard.user_id == user_id,
             UserCard.is_active == True
-        ).all()
-        user_card_ids = [uc.credit_card_id for uc in user_cards]
+        ))).all())
+        
+        # Best specific/general reward amount per (available card, category) for this spend
+        table = await get_reward_table(self.db)
+        categories = list(spending_pattern)
+        annual_amounts = annual_spending(spending_pattern)
+        specific, specific_cashback, general, general_cashback = best_reward_amounts(
+            table.reward_rows, table.reward_columns, table.reward_rates, table.reward_caps, table.reward_cashback,
+            table.columns(categories), annual_amounts, len(table.card_index)
+        )
+        rows = np.fromiter((table.card_index.get(card.id, -1) for card in available_cards), dtype=np.intp, count=len(available_cards))
+        specific, specific_cashback = specific[rows], specific_cashback[rows]
+        general, general_cashback = general[rows], general_cashback[rows]
+        
+        # Only cards the user doesn't hold yet add their annual fee to a combination's cost
+        owned = np.fromiter((card.id in user_card_ids for card in available_cards), dtype=np.bool_, count=len(available_cards))
+        annual_fees = np.fromiter((card.annual_fee for card in available_cards), dtype=np.float64, count=len(available_cards))
+        fees = np.where(owned, 0.0, annual_fees)
+        
+        # Branch and bound over combinations of 1 to max_cards cards, keeping the top 5
+        combos, sizes, combos_cashback, combos_points = top_combinations(
+            specific, specific_cashback, general, general_cashback, fees, POINT_CASH_VALUE, max_cards, 5
+        )
+        
+        # Winners mostly share cards; validate each distinct card into its schema once
+        winners = [combo[:size] for combo, size in zip(combos.tolist(), sizes.tolist())]
+        card_models = {i: CreditCardSchema.model_validate(available_cards[i]) for i in sorted(set(itertools.chain.from_iterable(winners)))}
         
         best_combinations = []
-        
-        # Try different combinations of cards (1 to max_cards)
-        for num_cards in range(1, min(max_cards + 1, len(available_cards) + 1)):
-            for card_combination in itertools.combinations(available_cards, num_cards):
-                combination_rewards = self._calculate_combination_rewards(
-                    card_combination, spending_pattern
-                )
-                
-                total_annual_fee = sum(card.annual_fee for card in card_combination)
-                net_benefit = combination_rewards['total_cashback'] - total_annual_fee
-                
-                # Convert points to approximate cash value (assuming 1 point = RM 0.01)
-                points_cash_value = combination_rewards['total_points'] * 0.01
-                total_benefit = net_benefit + points_cash_value
-                
-                card_combo = CardCombination(
-                    cards=list(card_combination),
-                    projected_cashback=combination_rewards['total_cashback'],
-                    projected_points=combination_rewards['total_points'],
-                    total_annual_fee=total_annual_fee,
-                    net_benefit=total_benefit
-                )
-                
-                best_combinations.append(card_combo)
-        
-        # Sort by net benefit and return top combinations
-        best_combinations.sort(key=lambda x: x.net_benefit, reverse=True)
-        return best_combinations[:5]  # Return top 5 combinations
-    
-    def _calculate_combination_rewards(self, cards: Tuple[CreditCard], spending_pattern: Dict[str, float]) -> Dict[str, float]:
-        """Calculate rewards for a combination of cards, optimizing category allocation"""
-        total_cashback = 0.0
-        total_points = 0.0
-        
-        # For each spending category, find the best card in the combination
-        for category, monthly_amount in spending_pattern.items():
-            annual_amount = monthly_amount * 12
-            best_reward = 0.0
-            best_type = "cashback"
+        for combo, combo_cashback, combo_points in zip(winners, combos_cashback.tolist(), combos_points.tolist()):
+            card_combination = [card_models[i] for i in combo]
+            total_annual_fee = sum(card.annual_fee for card in card_combination)
+            net_benefit = combo_cashback - sum(card.annual_fee for card in card_combination if card.id not in user_card_ids)
             
-            for card in cards:
-                card_rewards = self.db.query(CardReward).filter(
-                    CardReward.credit_card_id == card.id,
-                    CardReward.is_active == True
-                ).all()
-                
-                for reward in card_rewards:
-                    if reward.category and reward.category.name == category:
-                        applicable_amount = annual_amount
-                        if reward.maximum_spend:
-                            applicable_amount = min(applicable_amount, reward.maximum_spend * 12)
-                        
-                        reward_amount = applicable_amount * reward.reward_rate
-                        if reward_amount > best_reward:
-                            best_reward = reward_amount
-                            best_type = reward.reward_type.value
+            # Convert points to approximate cash value
+            points_cash_value = combo_points * POINT_CASH_VALUE
+            total_benefit = net_benefit + points_cash_value
             
-            # If no specific category reward found, use general rewards
-            if best_reward == 0.0:
-                for card in cards:
-                    card_rewards = self.db.query(CardReward).filter(
-                        CardReward.credit_card_id == card.id,
-                        CardReward.is_active == True,
-                        CardReward.category == None
-                    ).all()
-                    
-                    for reward in card_rewards:
-                        applicable_amount = annual_amount
-                        if reward.maximum_spend:
-                            applicable_amount = min(applicable_amount, reward.maximum_spend * 12)
-                        
-                        reward_amount = applicable_amount * reward.reward_rate
-                        if reward_amount > best_reward:
-                            best_reward = reward_amount
-                            best_type = reward.reward_type.value
-            
-            if best_type == "cashback":
-                total_cashback += best_reward
-            else:
-                total_points += best_reward
-        
-        return {
-            'total_cashback': total_cashback,
-            'total_points': total_points
-        }
+            best_combinations.append(CardCombination(
+                cards=card_combination,
+                projected_cashback=combo_cashback,
+                projected_points=combo_points,
+                total_annual_fee=total_annual_fee,
+                net_benefit=total_benefit
+            ))
+        
+        # Already ranked by net benefit
+        return best_combinations
     
-    def get_purchase_recommendation(self, user_id: int, merchant_id: int, amount: float) -> Dict:
+    async def get_purchase_recommendation(self, user_id: int, merchant_id: int, amount: float) -> Dict:
         """Recommend the best card for a specific purchase"""
-        # Get user's cards
-        user_cards = self.db.query(UserCard).join(CreditCard).filter(
-            UserCard.user_id == user_id,
-            UserCard.is_active == True,
-            CreditCard.is_active == True
-        ).all()
-        
-        if not user_cards:
-            return {"message": "No active cards found for user"}
-        
         # Get merchant and category
-        merchant = self.db.query(Merchant).filter(Merchant.id == merchant_id).first()
-        if not merchant:
-            return {"error": "Merchant not found"}
-        
-        best_card = None
-        best_reward = 0.0
-        best_type = "cashback"
-        
-        for user_card in user_cards:
-            card = user_card.credit_card
-            rewards = self.db.query(CardReward).filter(
-                CardReward.credit_card_id == card.id,
-                CardReward.is_active == True
-            ).all()
-            
-            for reward in rewards:
-                reward_amount = 0.0
-                
-                # Check category-specific rewards
-                if reward.category_id == merchant.category_id:
-                    reward_amount = amount * reward.reward_rate
-                # Check merchant-specific rewards
-                elif reward.merchant_id == merchant_id:
-                    reward_amount = amount * reward.reward_rate
-                # Check general rewards
-                elif reward.category_id is None and reward.merchant_id is None:
-                    reward_amount = amount * reward.reward_rate
-                
-                if reward_amount > best_reward:
-                    best_reward = reward_amount
-                    best_card = card
-                    best_type = reward.reward_type.value
+        merchant = await self.db.get(Merchant, merchant_id, options=[joinedload(Merchant.category)])
+        
+        # Best category-specific, merchant-specific or general reward across the user's active cards
+        best = None
+        if merchant:
+            reward_amount = (amount * CardReward.reward_rate).label('reward_amount')
+            best = (await self.db.execute(select(
+                CreditCard.id,
+                CreditCard.name,
+                CreditCard.bank,
+                CardReward.reward_type,
+                reward_amount
+            ).join(
+                UserCard, UserCard.credit_card_id == CreditCard.id
+            ).join(
+                CardReward, CardReward.credit_card_id == CreditCard.id
+            ).where(
+                UserCard.user_id == user_id,
+                UserCard.is_active == True,
+                CreditCard.is_active == True,
+                CardReward.is_active == True,
+                or_(
+                    CardReward.category_id == merchant.category_id,
+                    CardReward.merchant_id == merchant_id,
+                    and_(CardReward.category_id.is_(None), CardReward.merchant_id.is_(None))
+                )
+            ).order_by(
+                reward_amount.desc(), UserCard.id, CardReward.id
+            ).limit(1))).first()
         
-        if best_card:
+        if best and best.reward_amount > 0:
             return {
                 "recommended_card": {
-                    "id": best_card.id,
-                    "name": best_card.name,
-                    "bank": best_card.bank
+                    "id": best.id,
+                    "name": best.name,
+                    "bank": best.bank
                 },
-                "reward_amount": best_reward,
-                "reward_type": best_type,
+                "reward_amount": best.reward_amount,
+                "reward_type": best.reward_type.value,
                 "merchant": merchant.name,
                 "category": merchant.category.name
             }
         
+        # Nothing to recommend; only now work out which message applies
+        has_cards = await self.db.scalar(select(exists().where(
+            UserCard.credit_card_id == CreditCard.id,
+            UserCard.user_id == user_id,
+            UserCard.is_active == True,
+            CreditCard.is_active == True
+        )))
+        if not has_cards:
+            return {"message": "No active cards found for user"}
+        if not merchant:
+            return {"error": "Merchant not found"}
+        
         return {"message": "No suitable card found for this purchase"}
\ No newline at end of file
@@ -0,0 +1,88 @@
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import catalog_version
+from app.core.config import settings
+from app.db.models import CardReward, Category, RewardType
+
+# Reward types are handled as small integer codes (indices into REWARD_TYPES) in the arrays
+REWARD_TYPES: List[str] = [reward_type.value for reward_type in RewardType]
+REWARD_TYPE_CODES: Dict[RewardType, int] = {reward_type: code for code, reward_type in enumerate(RewardType)}
+CASHBACK = REWARD_TYPE_CODES[RewardType.CASHBACK]
+
+class RewardTable:
+    """Best reward rate and type per (card, category) as dense NumPy arrays"""
+    
+    def __init__(self, rewards, category_names: List[str]):
+        self.category_index: Dict[str, int] = {name: k for k, name in enumerate(category_names)}
+        self.card_index: Dict[int, int] = {}
+        for reward in rewards:
+            self.card_index.setdefault(reward.credit_card_id, len(self.card_index))
+    
+        # The extra last column holds each card's general (category-less) reward
+        shape = (len(self.card_index), len(category_names) + 1)
+        self.rates = np.zeros(shape)
+        self.types = np.full(shape, CASHBACK, dtype=np.int8)
+        type_codes = [REWARD_TYPE_CODES[reward.reward_type] for reward in rewards]
+    
+        # Rewards arrive ordered by id; strict ">" keeps the first of equal rates
+        for reward, type_code in zip(rewards, type_codes):
+            i = self.card_index[reward.credit_card_id]
+            k = self.category_index[reward.category] if reward.category is not None else -1
+            if reward.reward_rate > self.rates[i, k]:
+                self.rates[i, k] = reward.reward_rate
+                self.types[i, k] = type_code
+    
+        # Categories without a specific reward fall back to the general one
+        has_specific = self.rates[:, :-1] > 0.0
+        self.effective_rates = self.rates.copy()
+        self.effective_rates[:, :-1] = np.where(has_specific, self.rates[:, :-1], self.rates[:, -1:])
+        self.effective_types = self.types.copy()
+        self.effective_types[:, :-1] = np.where(has_specific, self.types[:, :-1], self.types[:, -1:])
+        
+        # Reward-level arrays for cap-aware scoring; general rewards have column -1
+        self.reward_rows = np.array([self.card_index[reward.credit_card_id] for reward in rewards], dtype=np.intp)
+        self.reward_columns = np.array([
+            self.category_index[reward.category] if reward.category is not None else -1
+            for reward in rewards
+        ], dtype=np.intp)
+        self.reward_rates = np.array([reward.reward_rate for reward in rewards], dtype=np.float64)
+        self.reward_caps = np.array([
+            reward.maximum_spend * 12 if reward.maximum_spend else np.inf
+            for reward in rewards
+        ], dtype=np.float64)
+        self.reward_cashback = np.array(type_codes, dtype=np.int8) == CASHBACK
+    
+    def columns(self, categories: List[str]) -> np.ndarray:
+        """Column index for each category; unknown ones map to the general column"""
+        return np.fromiter((self.category_index.get(name, -1) for name in categories), dtype=np.intp, count=len(categories))
+
+_table: Optional[RewardTable] = None
+_loaded_at = 0.0
+_loaded_version = -1
+
+async def get_reward_table(db: AsyncSession) -> RewardTable:
+    """Get the process-wide reward table, reloading it when stale"""
+    global _table, _loaded_at, _loaded_version
+    # The catalogue version catches changes made through the API; the TTL catches the rest
+    version = catalog_version()
+    if _table is None or version != _loaded_version or time.monotonic() - _loaded_at > settings.REWARD_TABLE_TTL_SECONDS:
+        rewards = (await db.execute(select(
+            CardReward.credit_card_id,
+            Category.name.label('category'),
+            CardReward.reward_type,
+            CardReward.reward_rate,
+            CardReward.maximum_spend
+        ).outerjoin(
+            Category, CardReward.category_id == Category.id
+        ).where(
+            CardReward.is_active == True
+        ).order_by(CardReward.id))).all()
+    
+        category_names = sorted({reward.category for reward in rewards if reward.category is not None})
+        _table = RewardTable(rewards, category_names)
+        _loaded_at = time.monotonic()
+        _loaded_version = version
+    return _table
\ No newline at end of file
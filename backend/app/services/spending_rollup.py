@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Tuple
+from sqlalchemy import select, literal, delete, insert, extract, func, cast, Integer, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql.dml import Delete, Insert
+from app.db.models import MonthlyRollup, Expense, Merchant
+
+_ROLLUP_COLUMNS = ["user_id", "year", "month", "category_id", "total", "transaction_count"]
+
+def _utc_year_month(timestamp):
+    """Year and month of a timestamp, bucketed in UTC regardless of session or client offset"""
+    utc = func.timezone('UTC', timestamp)
+    return extract('year', utc).cast(Integer), extract('month', utc).cast(Integer)
+
+def rollup_delta(user_id: int, merchant_id: int, expense_date: datetime, amount: float, sign: int = 1) -> Insert:
+    """Build an upsert adding (sign=1) or removing (sign=-1) one expense from the monthly rollup"""
+    # The merchant's category is resolved inside the statement; no rows are
+    # written if the merchant does not exist. The date is cast to timestamptz in SQL,
+    # so a naive value is read in the session time zone exactly as the stored column
+    # is, and the month lands where rebuild_rollup would put it
+    year, month = _utc_year_month(cast(literal(expense_date, DateTime(timezone=True)), DateTime(timezone=True)))
+    delta = select(
+        literal(user_id),
+        year,
+        month,
+        Merchant.category_id,
+        literal(amount * sign),
+        literal(sign)
+    ).where(Merchant.id == merchant_id)
+    
+    stmt = pg_insert(MonthlyRollup).from_select(_ROLLUP_COLUMNS, delta)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "year", "month", "category_id"],
+        set_={
+            "total": MonthlyRollup.total + stmt.excluded.total,
+            "transaction_count": MonthlyRollup.transaction_count + stmt.excluded.transaction_count
+        }
+    )
+
+def rebuild_rollup() -> Tuple[Delete, Insert]:
+    """Build the statements that recompute the whole rollup from the expenses table"""
+    year, month = _utc_year_month(Expense.expense_date)
+    totals = select(
+        Expense.user_id,
+        year,
+        month,
+        Merchant.category_id,
+        func.sum(Expense.amount),
+        func.count(Expense.id)
+    ).join(
+        Merchant, Expense.merchant_id == Merchant.id
+    ).group_by(Expense.user_id, year, month, Merchant.category_id)
+    
+    return delete(MonthlyRollup), insert(MonthlyRollup).from_select(_ROLLUP_COLUMNS, totals)
\ No newline at end of file
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+import pytest
+from app.core.cache import invalidate_catalog_cache
+from app.db.models import CreditCard, CardReward, CardType, RewardType
+
+def _dashboard(client, headers):
+    response = client.get("/api/v1/analytics/dashboard-summary", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def _add_expense(client, headers, merchant_id, amount):
+    # Rollup months are bucketed in UTC
+    response = client.post("/api/v1/expenses/", headers=headers, json={
+        "merchant_id": merchant_id, "amount": amount, "expense_date": datetime.now(timezone.utc).isoformat()
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+def _top_card_ids(client, headers):
+    response = client.post("/api/v1/recommendations/optimize", headers=headers, json={})
+    assert response.status_code == 200, response.text
+    return [card["id"] for card in response.json()["recommendations"][0]["cards"]]
+
+@pytest.fixture
+def premium_card(db):
+    """A card whose annual fee outweighs its rewards unless the user already holds it"""
+    card = CreditCard(name="Test Premium", bank="Test Bank", card_type=CardType.CASHBACK, annual_fee=100000.0)
+    db.add(card)
+    db.flush()
+    db.add(CardReward(credit_card_id=card.id, reward_type=RewardType.CASHBACK, reward_rate=0.5))
+    db.commit()
+    invalidate_catalog_cache()
+    
+    yield card.id
+    
+    card.is_active = False
+    db.commit()
+    invalidate_catalog_cache()
+
+def test_expense_changes_invalidate_cached_analytics(client, auth_headers, merchant_ids):
+    assert _dashboard(client, auth_headers)["current_month_spending"] == 0.0
+    
+    expense_id = _add_expense(client, auth_headers, merchant_ids[0], 40.0)
+    assert _dashboard(client, auth_headers)["current_month_spending"] == 40.0
+    
+    response = client.put(f"/api/v1/expenses/{expense_id}", headers=auth_headers, json={"amount": 55.0})
+    assert response.status_code == 200, response.text
+    assert _dashboard(client, auth_headers)["current_month_spending"] == 55.0
+    
+    response = client.delete(f"/api/v1/expenses/{expense_id}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert _dashboard(client, auth_headers)["current_month_spending"] == 0.0
+
+def test_wallet_changes_invalidate_cached_recommendations(client, auth_headers, merchant_ids, premium_card):
+    _add_expense(client, auth_headers, merchant_ids[0], 1000.0)
+    assert premium_card not in _top_card_ids(client, auth_headers)
+    
+    # Holding the card waives its fee, so it should now lead the recommendations
+    response = client.post("/api/v1/users/me/cards", headers=auth_headers, json={"credit_card_id": premium_card})
+    assert response.status_code == 200, response.text
+    assert premium_card in _top_card_ids(client, auth_headers)
+    
+    response = client.delete(f"/api/v1/users/me/cards/{premium_card}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert premium_card not in _top_card_ids(client, auth_headers)
+def test_etag_revalidation_until_invalidated(client, auth_headers, merchant_ids):
+    url = "/api/v1/recommendations/spending-analysis"
+    _add_expense(client, auth_headers, merchant_ids[0], 30.0)
+    first = client.get(url, headers=auth_headers)
+    assert first.status_code == 200, first.text
+    etag = first.headers["ETag"]
+    
+    # An unchanged response is answered with 304 and no body
+    revalidated = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+    
+    # New spending invalidates the cached body and with it the ETag
+    _add_expense(client, auth_headers, merchant_ids[0], 70.0)
+    changed = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200, changed.text
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["total_monthly_spending"] != first.json()["total_monthly_spending"]
+
+def test_etag_ignores_card_id_order(client, auth_headers, merchant_ids):
+    _add_expense(client, auth_headers, merchant_ids[0], 30.0)
+    first = client.get("/api/v1/recommendations/card-comparison?card_ids=1,2", headers=auth_headers)
+    assert first.status_code == 200, first.text
+    
+    response = client.get(
+        "/api/v1/recommendations/card-comparison?card_ids=2&card_ids=1",
+        headers={**auth_headers, "If-None-Match": first.headers["ETag"]}
+    )
+    assert response.status_code == 304
\ No newline at end of file
@@ -0,0 +1,13 @@
+def test_total_is_kept_on_pages_past_the_end(client, auth_headers, merchant_ids):
+    for day in (1, 2, 3):
+        response = client.post("/api/v1/expenses/", headers=auth_headers, json={
+            "merchant_id": merchant_ids[0], "amount": 10.0 * day, "expense_date": f"2024-05-0{day}T12:00:00"
+        })
+        assert response.status_code == 200, response.text
+    
+    last_page = client.get("/api/v1/expenses/?skip=2&limit=2", headers=auth_headers).json()
+    assert [item["amount"] for item in last_page["items"]] == [10.0]
+    assert last_page["total"] == 3
+    
+    past_the_end = client.get("/api/v1/expenses/?skip=10&limit=2", headers=auth_headers).json()
+    assert past_the_end == {"items": [], "total": 3}
\ No newline at end of file
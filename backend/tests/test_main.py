@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from fastapi import Request
+from sqlalchemy.exc import DBAPIError, OperationalError
+from app.main import database_error_handler
+
+class DriverError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+def _handle(exc):
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+    return asyncio.run(database_error_handler(request, exc))
+
+@pytest.mark.parametrize("error_class", [DBAPIError, OperationalError])
+@pytest.mark.parametrize("sqlstate", ["57014", "55P03"])
+def test_statement_and_lock_timeouts_map_to_504(error_class, sqlstate):
+    # asyncpg surfaces cancellations as a plain DBAPIError, psycopg2 as OperationalError
+    response = _handle(error_class("SELECT 1", {}, DriverError(sqlstate)))
+    assert response.status_code == 504
+
+def test_other_database_errors_are_a_plain_500():
+    response = _handle(DBAPIError("SELECT 1", {}, DriverError("23505")))
+    assert response.status_code == 500
+    assert response.body == b'{"detail":"Internal Server Error"}'
\ No newline at end of file
@@ -0,0 +1,63 @@
+import itertools
+import numpy as np
+import pytest
+from app.services.optimizer_kernels import top_combinations
+
+POINT_VALUE = 0.01
+TOP_K = 5
+
+def brute_force_top(specific, specific_cashback, general, general_cashback, fees, max_cards):
+    """Score every combination of up to max_cards cards and keep the best TOP_K"""
+    num_cards, num_categories = specific.shape
+    ranked = []
+    for size in range(1, min(max_cards, num_cards) + 1):
+        for combo in itertools.combinations(range(num_cards), size):
+            cashback = 0.0
+            points = 0.0
+            for k in range(num_categories):
+                # Best category-specific reward in card order, general rewards only as a fallback
+                best, is_cashback = 0.0, True
+                for c in combo:
+                    if specific[c, k] > best:
+                        best, is_cashback = specific[c, k], specific_cashback[c, k]
+                if best == 0.0:
+                    for c in combo:
+                        if general[c, k] > best:
+                            best, is_cashback = general[c, k], general_cashback[c, k]
+                if is_cashback:
+                    cashback += best
+                else:
+                    points += best
+            fee = 0.0
+            for c in combo:
+                fee += fees[c]
+            ranked.append((cashback - fee + points * POINT_VALUE, list(combo), cashback, points))
+    
+    # Stable sort keeps enumeration order (fewer cards, then lower indices) among equal nets
+    ranked.sort(key=lambda entry: entry[0], reverse=True)
+    return ranked[:TOP_K]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_top_combinations_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # Few distinct amounts and fees so ties and zero-fee cards are common
+    amounts = np.array([0.0, 1.0, 2.5, 5.0, 12.0])
+    for _ in range(150):
+        num_cards = int(rng.integers(0, 14))
+        num_categories = int(rng.integers(1, 8))
+        max_cards = int(rng.integers(1, 5))
+        shape = (num_cards, num_categories)
+        specific = rng.choice(amounts, size=shape) * (rng.random(shape) < 0.4)
+        general = rng.choice(amounts, size=shape) * (rng.random(shape) < 0.6)
+        specific_cashback = rng.random(shape) < 0.7
+        general_cashback = rng.random(shape) < 0.7
+        fees = rng.choice(np.array([0.0, 0.0, 1.0, 3.0, 150.0]), size=num_cards)
+    
+        expected = brute_force_top(specific, specific_cashback, general, general_cashback, fees, max_cards)
+        combos, sizes, cashback, points = top_combinations(
+            specific, specific_cashback, general, general_cashback, fees, POINT_VALUE, max_cards, TOP_K
+        )
+    
+        assert [combo[:size] for combo, size in zip(combos.tolist(), sizes.tolist())] == [entry[1] for entry in expected]
+        assert cashback.tolist() == pytest.approx([entry[2] for entry in expected])
+        assert points.tolist() == pytest.approx([entry[3] for entry in expected])
\ No newline at end of file
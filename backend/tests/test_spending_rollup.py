@@ -0,0 +1,76 @@
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.db.models import Expense, MonthlyRollup
+from app.services.spending_rollup import rollup_delta, rebuild_rollup
+
+def test_rollup_delta_casts_expense_date_in_sql():
+    # A naive date must be read as timestamptz (in the session time zone, like the
+    # stored column) before the UTC month is taken, not as UTC wall time
+    stmt = rollup_delta(1, 2, datetime(2024, 1, 31, 23, 30), 10.0)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    
+    assert sql.count("timezone(%(timezone_1)s, CAST(%(param_2)s AS TIMESTAMP WITH TIME ZONE))") == 2
+
+def _rollup(db, user_id):
+    """The user's non-empty rollup rows, totals rounded to cents"""
+    rows = db.execute(select(
+        MonthlyRollup.year,
+        MonthlyRollup.month,
+        MonthlyRollup.category_id,
+        MonthlyRollup.total,
+        MonthlyRollup.transaction_count
+    ).where(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.transaction_count != 0
+    ).order_by(MonthlyRollup.year, MonthlyRollup.month, MonthlyRollup.category_id)).all()
+    return [(year, month, category_id, round(total, 2), count) for year, month, category_id, total, count in rows]
+
+def _rebuilt(db, user_id):
+    for statement in rebuild_rollup():
+        db.execute(statement)
+    db.commit()
+    return _rollup(db, user_id)
+
+def test_rollup_delta_matches_rebuild_at_month_boundary(db, user_id, merchant_ids):
+    # Naive 23:30 on the 31st is January in the session's UTC+8 zone (15:30 UTC),
+    # but February if it were misread as UTC wall time
+    expense_date = datetime(2024, 1, 31, 23, 30)
+    db.add(Expense(user_id=user_id, merchant_id=merchant_ids[0], amount=25.0, expense_date=expense_date))
+    db.execute(rollup_delta(user_id, merchant_ids[0], expense_date, 25.0))
+    db.commit()
+    
+    incremental = _rollup(db, user_id)
+    assert [(year, month) for year, month, *_ in incremental] == [(2024, 1)]
+    assert incremental == _rebuilt(db, user_id)
+
+def test_rollup_follows_expense_changes(client, db, auth_headers, user_id, merchant_ids):
+    def create(merchant_id, amount, expense_date):
+        response = client.post("/api/v1/expenses/", headers=auth_headers, json={
+            "merchant_id": merchant_id, "amount": amount, "expense_date": expense_date
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    
+    # Naive and offset-carrying dates on both sides of month boundaries
+    first = create(merchant_ids[0], 10.0, "2024-01-31T23:30:00")
+    second = create(merchant_ids[1], 20.0, "2024-03-01T00:30:00+08:00")
+    third = create(merchant_ids[2], 30.0, "2024-02-15T12:00:00")
+    incremental = _rollup(db, user_id)
+    assert {(year, month) for year, month, *_ in incremental} == {(2024, 1), (2024, 2)}
+    assert incremental == _rebuilt(db, user_id)
+    
+    # Move one expense across the boundary, touch another without changing its bucket,
+    # and delete a third
+    response = client.put(f"/api/v1/expenses/{first}", headers=auth_headers, json={
+        "merchant_id": merchant_ids[-1], "amount": 15.0, "expense_date": "2024-02-01T00:30:00+08:00"
+    })
+    assert response.status_code == 200, response.text
+    response = client.put(f"/api/v1/expenses/{second}", headers=auth_headers, json={"description": "Renamed"})
+    assert response.status_code == 200, response.text
+    response = client.delete(f"/api/v1/expenses/{third}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    
+    incremental = _rollup(db, user_id)
+    assert sum(count for *_, count in incremental) == 2
+    assert incremental == _rebuilt(db, user_id)
\ No newline at end of file